@@ -0,0 +1,134 @@
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Max
+from datetime import date, timedelta
+from operator import itemgetter
+import numpy as np
+
+from .models import Bond
+
+
+# Upper edges (in years to maturity) of each maturity ladder bucket. Bonds which have already matured go into
+# the first bucket, and bonds maturing after the last edge go into the final bucket.
+LADDER_EDGES_IN_YEARS = [0, 1, 2, 3, 5, 7, 10, 20, 30]
+LADDER_BUCKETS = ["matured", "0-1y", "1-2y", "2-3y", "3-5y", "5-7y", "7-10y", "10-20y", "20-30y", "30y+"]
+
+DAYS_PER_YEAR = 365.25
+
+ANALYTICS_KEY = "bonds:analytics:{user_id}:{version}:{as_of}"
+
+# Memoized analytics are only reused for the same book version, so this just bounds how long unused entries are kept
+ANALYTICS_TIMEOUT = int(timedelta(hours=1).total_seconds())
+
+# Day number of 1970-01-01, the epoch of NumPy's datetime64
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def get_book_version(user_id):
+    """
+    Returns the current version of a user's book of bonds, which changes whenever one of their bonds is created,
+    updated or deleted. Read from the database, using the (user, updated_at) index, so all processes agree on it.
+    """
+
+    book = Bond.objects.filter(user_id=user_id).aggregate(last_updated_at=Max("updated_at"), bond_count=Count("id"))
+    last_updated_at = book["last_updated_at"].isoformat() if book["last_updated_at"] else "none"
+
+    return "{}-{}".format(last_updated_at, book["bond_count"])
+
+
+def load_book_arrays(user_id):
+    """Loads the size, currency and maturity columns of a user's bonds into NumPy arrays"""
+
+    # Run the query on a plain cursor, as building each row through values_list costs more than the query itself
+    query = Bond.objects.filter(user_id=user_id).values_list("size", "currency", "maturity").query
+    with connection.cursor() as cursor:
+        cursor.execute(*query.sql_with_params())
+        rows = cursor.fetchall()
+    row_count = len(rows)
+
+    sizes = np.fromiter(map(itemgetter(0), rows), dtype=np.int64, count=row_count)
+    currencies = np.array(list(map(itemgetter(1), rows)), dtype="U3")
+
+    # Converting date objects to datetime64 one by one is slow, so go via their day numbers instead
+    maturities = (np.fromiter((row[2].toordinal() for row in rows), dtype=np.int64, count=row_count)
+                  - EPOCH_ORDINAL).astype("datetime64[D]")
+
+    return sizes, currencies, maturities
+
+
+def compute_book_analytics(sizes, currencies, maturities, as_of):
+    """
+    Computes the maturity ladder, weighted average maturity (WAM) and currency breakdown of a book of bonds,
+    given its columns as NumPy arrays. WAM is in years and only includes bonds which have not yet matured.
+    """
+
+    years_to_maturity = (maturities - np.datetime64(as_of, "D")).astype(np.float64) / DAYS_PER_YEAR
+    bucket_indices = np.searchsorted(LADDER_EDGES_IN_YEARS, years_to_maturity, side="right")
+    weights = sizes.astype(np.float64)
+    outstanding = years_to_maturity >= 0
+
+    currency_codes, currency_indices = np.unique(currencies, return_inverse=True)
+    currency_count = len(currency_codes)
+    bucket_count = len(LADDER_BUCKETS)
+
+    # Sum sizes into a (currency, bucket) grid in one pass, then derive every other total from it
+    ladder_grid = np.bincount(currency_indices * bucket_count + bucket_indices, weights=weights,
+                              minlength=currency_count * bucket_count).reshape(currency_count, bucket_count)
+    currency_bond_counts = np.bincount(currency_indices, minlength=currency_count)
+    currency_outstanding_sizes = np.bincount(currency_indices, weights=weights * outstanding,
+                                             minlength=currency_count)
+    currency_weighted_years = np.bincount(currency_indices, weights=weights * years_to_maturity * outstanding,
+                                          minlength=currency_count)
+
+    currency_breakdown = {}
+    for i, currency in enumerate(currency_codes):
+        currency_breakdown[str(currency)] = {
+            "count": int(currency_bond_counts[i]),
+            "total_size": int(ladder_grid[i].sum()),
+            "weighted_average_maturity": weighted_average(currency_weighted_years[i], currency_outstanding_sizes[i]),
+            "ladder": format_ladder(ladder_grid[i])
+        }
+
+    return {
+        "as_of": as_of.strftime("%Y-%m-%d"),
+        "count": int(len(sizes)),
+        "total_size": int(sizes.sum()),
+        "weighted_average_maturity": weighted_average(currency_weighted_years.sum(),
+                                                      currency_outstanding_sizes.sum()),
+        "ladder": format_ladder(ladder_grid.sum(axis=0)),
+        "currencies": currency_breakdown
+    }
+
+
+def weighted_average(weighted_total, total_weight):
+    """Returns the weighted average rounded to 4 decimal places, or None if there is nothing to average over"""
+
+    if total_weight == 0:
+        return None
+    return round(float(weighted_total / total_weight), 4)
+
+
+def format_ladder(bucket_sizes):
+    """Formats an array of summed sizes, one per ladder bucket, as a list of bucket dicts"""
+
+    return [{"bucket": bucket, "size": int(size)} for bucket, size in zip(LADDER_BUCKETS, bucket_sizes)]
+
+
+def get_book_analytics_key(user_id, as_of):
+    """Returns the cache key for the analytics of the current version of a user's book as of a date"""
+
+    return ANALYTICS_KEY.format(user_id=user_id, version=get_book_version(user_id), as_of=as_of.isoformat())
+
+
+def get_book_analytics(user_id, as_of=None):
+    """Returns the analytics for a user's book of bonds, memoized per version of the book and as-of date"""
+
+    as_of = as_of or date.today()
+    key = get_book_analytics_key(user_id, as_of)
+
+    analytics = cache.get(key)
+    if analytics is None:
+        analytics = compute_book_analytics(*load_book_arrays(user_id), as_of)
+        cache.set(key, analytics, timeout=ANALYTICS_TIMEOUT)
+
+    return analytics
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class BondsConfig(AppConfig):
     name = 'bonds'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,61 @@
+from django.core.cache import cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from datetime import timedelta
+
+
+LEGAL_NAME_KEY = "bonds:legal_name:{lei}"
+TOKEN_KEY = "bonds:token:{key}"
+
+# Legal names rarely change, so can be cached in each process. Tokens are cached in the shared cache, so evicting one
+# when it is revoked or its user changes applies to every process. They still expire quickly, as changes which bypass
+# model signals, such as QuerySet.update(), can't evict them.
+LEGAL_NAME_TIMEOUT = int(timedelta(days=1).total_seconds())
+TOKEN_TIMEOUT = int(timedelta(minutes=5).total_seconds())
+
+# Built-in backends which either aren't shared between processes, or are no faster than looking a token up in the
+# database, so can't be used to cache tokens. Use memcached or Redis instead.
+UNSHARED_CACHE_BACKENDS = (DummyCache, DatabaseCache, FileBasedCache, LocMemCache)
+
+
+def is_shared_cache_configured():
+    """Returns True if the shared cache uses a fast backend which is shared between processes, such as memcached"""
+
+    return type(caches["shared"]) not in UNSHARED_CACHE_BACKENDS
+
+
+def get_cached_legal_name(lei_code):
+    """Returns the cached legal name for a LEI code, or None if it isn't cached"""
+
+    return cache.get(LEGAL_NAME_KEY.format(lei=lei_code))
+
+
+def cache_legal_names(legal_names):
+    """Caches a dict mapping LEI codes to legal names"""
+
+    cache.set_many({LEGAL_NAME_KEY.format(lei=lei_code): legal_name for lei_code, legal_name in legal_names.items()},
+                   timeout=LEGAL_NAME_TIMEOUT)
+
+
+def get_cached_token(key):
+    """Returns the cached (user id, is_active) of the user of an auth token key, or None if it isn't cached"""
+
+    return caches["shared"].get(TOKEN_KEY.format(key=key))
+
+
+def cache_tokens(token_users):
+    """
+    Caches a dict mapping auth token keys to the (user id, is_active) of their users. Only these are cached, so
+    nothing sensitive, such as password hashes, is written to the cache.
+    """
+
+    caches["shared"].set_many({TOKEN_KEY.format(key=key): user for key, user in token_users.items()},
+                              timeout=TOKEN_TIMEOUT)
+
+
+def uncache_tokens(keys):
+    """Removes auth tokens from the cache, so they are next loaded from the database"""
+
+    caches["shared"].delete_many([TOKEN_KEY.format(key=key) for key in keys])
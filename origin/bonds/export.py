@@ -0,0 +1,110 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .models import Bond
+
+
+EXPORT_FORMATS = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+EXPORT_SCHEMA = pa.schema([
+    ("isin", pa.string()),
+    ("size", pa.int64()),
+    ("currency", pa.string()),
+    ("maturity", pa.date32()),
+    ("lei", pa.string()),
+    ("legal_name", pa.string())
+])
+
+# Number of bonds written per Arrow record batch / Parquet row group
+DEFAULT_BATCH_SIZE = 65536
+
+
+class ChunkBuffer:
+    """Write-only file-like object which holds written bytes until they are drained"""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Returns and forgets everything written since the last drain"""
+
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_record_batches(user_id, batch_size=DEFAULT_BATCH_SIZE):
+    """Yields a user's bonds as Arrow record batches of at most batch_size rows, reading the table in chunks"""
+
+    rows = Bond.objects.filter(user_id=user_id).order_by("id").values_list(*EXPORT_SCHEMA.names)
+    columns = [[] for _ in EXPORT_SCHEMA.names]
+
+    for row in rows.iterator(chunk_size=batch_size):
+        for column, value in zip(columns, row):
+            column.append(value)
+
+        if len(columns[0]) == batch_size:
+            yield pa.RecordBatch.from_arrays(columns, schema=EXPORT_SCHEMA)
+            columns = [[] for _ in EXPORT_SCHEMA.names]
+
+    if columns[0]:
+        yield pa.RecordBatch.from_arrays(columns, schema=EXPORT_SCHEMA)
+
+
+def open_writer(sink, export_format):
+    """Opens an Arrow IPC stream or Parquet writer for the export schema on the given sink"""
+
+    if export_format == "arrow":
+        return pa.ipc.new_stream(sink, EXPORT_SCHEMA)
+    if export_format == "parquet":
+        return pq.ParquetWriter(sink, EXPORT_SCHEMA)
+    raise ValueError("Unsupported export format: " + export_format)
+
+
+def write_batch(writer, batch):
+    """Writes a record batch, which becomes its own row group when writing Parquet"""
+
+    if isinstance(writer, pq.ParquetWriter):
+        writer.write_table(pa.Table.from_batches([batch]))
+    else:
+        writer.write_batch(batch)
+
+
+def iter_export_chunks(user_id, export_format, batch_size=DEFAULT_BATCH_SIZE):
+    """Yields a user's bonds encoded in the given columnar format as a sequence of byte chunks, one per batch"""
+
+    buffer = ChunkBuffer()
+    writer = open_writer(buffer, export_format)
+
+    for batch in iter_record_batches(user_id, batch_size):
+        write_batch(writer, batch)
+        yield buffer.drain()
+
+    writer.close()
+    yield buffer.drain()
+
+
+def export_bonds(user_id, file_object, export_format, batch_size=DEFAULT_BATCH_SIZE):
+    """Writes a user's bonds in the given columnar format to a file object, returning the number of bonds written"""
+
+    writer = open_writer(file_object, export_format)
+    bond_count = 0
+
+    for batch in iter_record_batches(user_id, batch_size):
+        write_batch(writer, batch)
+        bond_count += batch.num_rows
+
+    writer.close()
+    return bond_count
@@ -0,0 +1,73 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from datetime import date, timedelta
+import numpy as np
+import time
+
+from bonds.analytics import compute_book_analytics, get_book_analytics, get_book_analytics_key, load_book_arrays
+from bonds.models import Bond
+
+
+class Command(BaseCommand):
+    help = ("Times the book analytics over a randomly generated book of bonds, both end to end through the database "
+            "and for the vectorized computation alone. The generated book is rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bonds", type=int, default=1000000, help="Number of bonds in the generated book")
+        parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for the random number generator")
+
+    def handle(self, *args, **options):
+        bond_count = options["bonds"]
+        as_of = date.today()
+
+        # Generate a book with maturities spread from 2 years in the past to 40 years in the future
+        random = np.random.RandomState(options["seed"])
+        sizes = random.randint(1000, 500000000, size=bond_count)
+        currencies = random.choice(["EUR", "GBP", "USD", "JPY", "CHF"], size=bond_count)
+        maturity_offsets = random.randint(-730, 40 * 365, size=bond_count)
+
+        with transaction.atomic():
+            user = User.objects.create_user(username="benchmark_analytics_user")
+
+            self.stdout.write("Seeding {} bonds...".format(bond_count))
+            Bond.objects.bulk_create(Bond(isin="XS{:010d}".format(i), size=int(sizes[i]), currency=currencies[i],
+                                          maturity=as_of + timedelta(days=int(maturity_offsets[i])),
+                                          lei="R0MUWSFPU8MPRO8K5P83", legal_name="BNP PARIBAS", user=user)
+                                     for i in range(bond_count))
+
+            arrays = load_book_arrays(user.id)
+            self.report("Load from database", bond_count, self.time_runs(options["repeat"],
+                                                                         lambda: load_book_arrays(user.id)))
+            self.report("Compute from arrays", bond_count, self.time_runs(
+                options["repeat"], lambda: compute_book_analytics(*arrays, as_of)))
+
+            # The book doesn't change between runs, so neither does its cache key
+            analytics_key = get_book_analytics_key(user.id, as_of)
+
+            def cold_run():
+                cache.delete(analytics_key)
+                get_book_analytics(user.id, as_of)
+
+            self.report("End to end, cold", bond_count, self.time_runs(options["repeat"], cold_run))
+            self.report("End to end, memoized", bond_count, self.time_runs(
+                options["repeat"], lambda: get_book_analytics(user.id, as_of)))
+
+            cache.delete(analytics_key)
+            transaction.set_rollback(True)
+
+    def time_runs(self, repeat, function):
+        """Returns the time taken by each of repeat calls to function"""
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    def report(self, label, bond_count, timings):
+        self.stdout.write("{} for {} bonds: best {:.1f} ms, mean {:.1f} ms over {} runs".format(
+            label, bond_count, min(timings) * 1000, sum(timings) / len(timings) * 1000, len(timings)))
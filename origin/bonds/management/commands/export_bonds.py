@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from bonds.export import DEFAULT_BATCH_SIZE, EXPORT_FORMATS, export_bonds
+
+
+class Command(BaseCommand):
+    help = "Exports a user's bonds as an Arrow IPC stream or Parquet file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="User whose bonds are exported")
+        parser.add_argument("path", help="File to write the export to")
+        parser.add_argument("--file-format", choices=list(EXPORT_FORMATS), default="parquet",
+                            help="Columnar file format to write")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Number of bonds per record batch or row group")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options["username"]).first()
+        if user is None:
+            raise CommandError("User '{}' does not exist".format(options["username"]))
+
+        with open(options["path"], "wb") as file_object:
+            bond_count = export_bonds(user.id, file_object, options["file_format"], options["batch_size"])
+
+        self.stdout.write("Exported {} bonds to {}".format(bond_count, options["path"]))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from bonds.views import purge_expired_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = ("Deletes the stored responses of expired Idempotency-Keys. Run it periodically, for example hourly from "
+            "cron, to stop the table growing.")
+
+    def handle(self, *args, **options):
+        deleted_count = purge_expired_idempotency_keys()
+
+        self.stdout.write("Purged {} expired idempotency keys".format(deleted_count))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from bonds.caches import is_shared_cache_configured
+from bonds.warmup import warm_up_tokens
+
+
+class Command(BaseCommand):
+    help = ("Preloads the most recently issued auth tokens into the shared cache, for CachedTokenAuthentication. "
+            "Legal names are cached in each server process, so are warmed up by the processes themselves when "
+            "BONDS_WARM_UP_ON_STARTUP is set.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--time-budget", type=float, default=settings.BONDS_WARM_UP_TIME_BUDGET,
+                            help="Seconds to spend warming up")
+        parser.add_argument("--memory-budget", type=int, default=settings.BONDS_WARM_UP_MEMORY_BUDGET,
+                            help="Bytes of cache entries to load")
+
+    def handle(self, *args, **options):
+        if not is_shared_cache_configured():
+            raise CommandError("The 'shared' cache must use memcached or Redis for tokens to be cached")
+
+        stats = warm_up_tokens(options["time_budget"], options["memory_budget"])
+
+        self.stdout.write("Cached {tokens} tokens ({bytes} bytes)".format(**stats))
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.13 on 2026-10-19 10:45
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bonds', '0002_bond_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bond',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='bond',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='bond',
+            index=models.Index(fields=['user', 'updated_at'], name='bonds_bond_user_id_2754c5_idx'),
+        ),
+    ]
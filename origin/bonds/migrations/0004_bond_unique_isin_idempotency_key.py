@@ -0,0 +1,54 @@
+# Generated by Django 2.2.13 on 2026-10-19 10:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def remove_duplicate_bonds(apps, schema_editor):
+    """Keeps only the most recently created bond for each (user, isin) so the unique constraint can be added"""
+
+    Bond = apps.get_model('bonds', 'Bond')
+    duplicates = (Bond.objects.values('user', 'isin')
+                  .annotate(latest_id=models.Max('id'), bond_count=models.Count('id'))
+                  .filter(bond_count__gt=1))
+    for duplicate in duplicates:
+        (Bond.objects.filter(user=duplicate['user'], isin=duplicate['isin'])
+         .exclude(id=duplicate['latest_id'])
+         .delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('bonds', '0003_bond_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('request_fingerprint', models.CharField(max_length=64)),
+                ('response_status', models.IntegerField()),
+                ('response_data', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(remove_duplicate_bonds, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='bond',
+            constraint=models.UniqueConstraint(fields=('user', 'isin'), name='unique_bond_isin_per_user'),
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('user', 'key'), name='unique_idempotency_key_per_user'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.13 on 2026-10-19 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bonds', '0004_bond_unique_isin_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('theoretical_arrival_time', models.FloatField(default=0)),
+            ],
+        ),
+    ]
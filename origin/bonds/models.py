@@ -11,3 +11,39 @@ class Bond(models.Model):
     lei = models.CharField(max_length=30)
     legal_name = models.CharField(max_length=100)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "updated_at"])
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "isin"], name="unique_bond_isin_per_user")
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """The stored response to a request sent with an Idempotency-Key header, replayed when the request is retried"""
+
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    request_fingerprint = models.CharField(max_length=64)
+    response_status = models.IntegerField()
+    response_data = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_idempotency_key_per_user")
+        ]
+
+
+class RateLimitBucket(models.Model):
+    """
+    Shared token bucket, stored as the theoretical arrival time (TAT) of the next request so that taking a token is
+    a single conditional UPDATE, which is atomic across worker processes
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    theoretical_arrival_time = models.FloatField(default=0)
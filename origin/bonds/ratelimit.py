@@ -0,0 +1,52 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+import time
+
+from .models import RateLimitBucket
+
+
+def acquire_token(name, rate, burst):
+    """
+    Takes a token from the named bucket, which refills at rate tokens per second up to burst tokens. Returns 0 if a
+    token was taken, otherwise the number of seconds until one will be available.
+    """
+
+    interval = 1.0 / rate
+    now = time.time()
+
+    # A request is allowed if taking it would not push the TAT more than a full bucket ahead of now
+    updated = (RateLimitBucket.objects
+               .filter(name=name, theoretical_arrival_time__lte=now + (burst - 1) * interval)
+               .update(theoretical_arrival_time=Greatest(F("theoretical_arrival_time"), Value(now)) + interval))
+    if updated:
+        return 0
+
+    theoretical_arrival_time = (RateLimitBucket.objects.filter(name=name)
+                                .values_list("theoretical_arrival_time", flat=True).first())
+    if theoretical_arrival_time is None:
+        # First use of the bucket, so create it full and try again
+        try:
+            with transaction.atomic():
+                RateLimitBucket.objects.create(name=name)
+        except IntegrityError:
+            pass
+        return acquire_token(name, rate, burst)
+
+    return max(theoretical_arrival_time - (burst - 1) * interval - now, 0.001)
+
+
+def wait_for_token(name, rate, burst, max_wait):
+    """
+    Blocks until a token is taken from the named bucket, and returns 0. If one would not be available within
+    max_wait seconds, returns the number of seconds until one will be instead.
+    """
+
+    deadline = time.time() + max_wait
+    while True:
+        wait = acquire_token(name, rate, burst)
+        if wait == 0:
+            return 0
+        if time.time() + wait > deadline:
+            return wait
+        time.sleep(wait)
@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .caches import uncache_tokens
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    """Removes a token from the shared auth cache when it is saved or deleted, so every process stops accepting it"""
+
+    uncache_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, **kwargs):
+    """Removes a user's tokens from the shared auth cache when they are saved, so every process sees changes to them"""
+
+    if not created:
+        uncache_tokens(Token.objects.filter(user=instance).values_list("key", flat=True))
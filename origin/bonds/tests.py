@@ -1,10 +1,32 @@
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase, APIClient
+from rest_framework.views import APIView
+from rest_framework.throttling import UserRateThrottle
 from django.contrib.auth.models import User
-from django.test import TestCase
-from datetime import datetime
-
-from .views import get_gleif_response
-from .models import Bond
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import date, datetime, timedelta
+import io
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+import tempfile
+from unittest import mock
+
+from .authentication import CachedTokenAuthentication
+from .caches import cache_legal_names, get_cached_legal_name, get_cached_token
+from .export import iter_record_batches
+from .ratelimit import acquire_token
+from .validation import validate_bond, is_valid_date, is_valid_isin, is_valid_lei, is_valid_size
+from .views import GleifRateLimitExceeded, get_gleif_response
+from .warmup import warm_up_legal_names, warm_up_on_startup, warm_up_tokens
+from .models import Bond, IdempotencyKey
 
 
 class GetGleifResponseTest(TestCase):
@@ -27,6 +49,87 @@ class GetGleifResponseTest(TestCase):
         self.assertEqual(gleif_response_oracle_json[0]["Entity"]["LegalName"]["$"], "ORACLE SYSTEMS CORPORATION")
 
 
+class RateLimitTest(TestCase):
+
+    def test_tokens_are_taken_until_the_bucket_is_empty(self):
+
+        self.assertEqual(acquire_token("test", rate=1, burst=2), 0)
+        self.assertEqual(acquire_token("test", rate=1, burst=2), 0)
+
+        wait = acquire_token("test", rate=1, burst=2)
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 1)
+
+        # Buckets are independent of each other
+        self.assertEqual(acquire_token("other", rate=1, burst=2), 0)
+
+    @override_settings(GLEIF_REQUESTS_PER_SECOND=1, GLEIF_BURST=1, GLEIF_MAX_WAIT=0)
+    def test_gleif_request_is_not_made_when_rate_limit_is_exceeded(self):
+
+        acquire_token("gleif", rate=1, burst=1)
+
+        with mock.patch("bonds.views.requests.get") as requests_get_mock:
+            with self.assertRaises(GleifRateLimitExceeded):
+                get_gleif_response("HWUPKR0MPOU8FGXBT394")
+            requests_get_mock.assert_not_called()
+
+
+class ValidationTest(TestCase):
+
+    valid_bond = {
+        "isin": "FR0000131104",
+        "size": 100000000,
+        "currency": "EUR",
+        "maturity": "2025-02-28",
+        "lei": "R0MUWSFPU8MPRO8K5P83"
+    }
+
+    def test_lei_checksum(self):
+
+        leis = ["R0MUWSFPU8MPRO8K5P83", "HWUPKR0MPOU8FGXBT394", "R0MUWSFPU8MPRO8K5P84", "R0MUWSFPU8MPRO8K5P_3",
+                "R0MUWSFPU8MPRO8K5P836", "r0muwsfpu8mpro8k5p83", "R0MUWSFPU8MPRO8K5PA3", None]
+        expected = [True, True, False, False, False, False, False, False]
+
+        self.assertEqual([is_valid_lei(lei) for lei in leis], expected)
+
+    def test_isin_check_digit(self):
+
+        isins = ["FR0000131104", "US0378331005", "GB0003HVGHA5", "GB0003HVGHA3", "FR000013110", "0R0000131104",
+                 "FR000013110A", None]
+        expected = [True, True, True, False, False, False, False, False]
+
+        self.assertEqual([is_valid_isin(isin) for isin in isins], expected)
+
+    def test_sizes_and_dates(self):
+
+        sizes = [100000000, "245678", 2147483647, 0, "-5", "1.5", 2147483648, "", "\u00b2", None]
+        expected_sizes = [True, True, True, False, False, False, False, False, False, False]
+        self.assertEqual([is_valid_size(size) for size in sizes], expected_sizes)
+
+        dates = ["2025-02-28", "2024-02-29", "2023-02-29", "2025-13-01", "2025/02/28", "2025-2-28", "2025-02-28a",
+                 None]
+        expected_dates = [True, True, False, False, False, False, False, False]
+        self.assertEqual([is_valid_date(date) for date in dates], expected_dates)
+
+    def test_first_error_is_returned_for_each_bond(self):
+
+        bonds = [
+            self.valid_bond,
+            dict(self.valid_bond, lei="R0MUWSFPU8MPRO8K5P84", isin="GB0003HVGHA3"),
+            dict(self.valid_bond, isin="GB0003HVGHA3"),
+            dict(self.valid_bond, currency="XYZ"),
+            dict(self.valid_bond, size="0"),
+            dict(self.valid_bond, maturity="2025-02-30"),
+            {}
+        ]
+        expected = [None, "LEI code is invalid", "ISIN is invalid",
+                    "Currency must be an ISO 4217 currency code. For example: EUR", "Size must be a positive integer",
+                    "Dates must be given in the following format: YYYY-mm-dd. For example: 2023-06-07",
+                    "LEI code is invalid"]
+
+        self.assertEqual([validate_bond(bond) for bond in bonds], expected)
+
+
 class BondsAPITest(APITestCase):
 
     # Helper method to create a user
@@ -75,6 +178,23 @@ class BondsAPITest(APITestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.data, "LEI code is invalid")
 
+    @mock.patch("bonds.views.get_gleif_response")
+    def test_status_400_returned_without_gleif_lookup_when_bond_is_invalid(self, get_gleif_response_mock):
+
+        bond_with_invalid_isin_check_digit = {
+            "isin": "FR0000131103",
+            "size": 100000000,
+            "currency": "EUR",
+            "maturity": "2025-02-28",
+            "lei": "R0MUWSFPU8MPRO8K5P83"
+        }
+
+        response = self.client.post(path="/bonds/", data=bond_with_invalid_isin_check_digit)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, "ISIN is invalid")
+        self.assertEqual(Bond.objects.count(), 0)
+        get_gleif_response_mock.assert_not_called()
+
     def test_status_404_returned_when_entity_doesnt_exist_for_lei_code(self):
 
         bond_with_non_existing_lei_code = {
@@ -82,7 +202,7 @@ class BondsAPITest(APITestCase):
             "size": 100000000,
             "currency": "EUR",
             "maturity": "2025-02-28",
-            "lei": "99999999999999999999"
+            "lei": "99999999999999999928"
         }
 
         response = self.client.post(path="/bonds/", data=bond_with_non_existing_lei_code)
@@ -131,7 +251,7 @@ class BondsAPITest(APITestCase):
         }
 
         bond_2 = {
-            "isin": "GB0003HVGHA3",
+            "isin": "GB0003HVGHA5",
             "size": 245678,
             "currency": "GBP",
             "maturity": "2022-06-06",
@@ -162,7 +282,7 @@ class BondsAPITest(APITestCase):
         }
 
         test_user_2_bond = {
-            "isin": "GB0003HVGHA3",
+            "isin": "GB0003HVGHA5",
             "size": 245678,
             "currency": "GBP",
             "maturity": "2022-06-06",
@@ -186,7 +306,7 @@ class BondsAPITest(APITestCase):
         get_response = self.client.get(path="/bonds/")
         self.assertEqual(get_response.status_code, 200)
         self.assertEqual(len(get_response.data), 1)
-        self.assertEqual(get_response.data[0]["isin"], "GB0003HVGHA3")
+        self.assertEqual(get_response.data[0]["isin"], "GB0003HVGHA5")
 
         # Log back into test_user_1, and check test_user_1_bond is the only bond returned
         self.login_user("test_user_1", "djy6T6W8ki$")
@@ -350,7 +470,7 @@ class BondsAPITest(APITestCase):
         }
 
         bond_2 = {
-            "isin": "GB0003HVGHA3",
+            "isin": "GB0003HVGHA5",
             "size": 245678,
             "currency": "EUR",
             "maturity": "2022-06-06",
@@ -364,7 +484,7 @@ class BondsAPITest(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data), 2)
         self.assertEqual(response.data[0].get("isin"), "FR0000131104")
-        self.assertEqual(response.data[1].get("isin"), "GB0003HVGHA3")
+        self.assertEqual(response.data[1].get("isin"), "GB0003HVGHA5")
 
     def test_search_with_term_that_matches_one_bond_returns_one_bond_only(self):
 
@@ -377,7 +497,7 @@ class BondsAPITest(APITestCase):
         }
 
         bond_2 = {
-            "isin": "GB0003HVGHA3",
+            "isin": "GB0003HVGHA5",
             "size": 245678,
             "currency": "EUR",
             "maturity": "2022-06-06",
@@ -390,7 +510,529 @@ class BondsAPITest(APITestCase):
         response = self.client.get(path="/bonds/", data={"size": "245678"})
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0].get("isin"), "GB0003HVGHA3")
+        self.assertEqual(response.data[0].get("isin"), "GB0003HVGHA5")
+
+
+class BondsUpsertAPITest(APITestCase):
+
+    bond = {
+        "isin": "FR0000131104",
+        "size": 100000000,
+        "currency": "EUR",
+        "maturity": "2025-02-28",
+        "lei": "R0MUWSFPU8MPRO8K5P83"
+    }
+
+    def setUp(self):
+
+        self.user = User.objects.create_user(username="test_user_1", password="djy6T6W8ki$")
+        self.client.force_authenticate(user=self.user)
+
+        Bond.objects.create(isin="FR0000131104", size=100000000, currency="EUR", maturity=date(2025, 2, 28),
+                            lei="R0MUWSFPU8MPRO8K5P83", legal_name="BNP PARIBAS", user=self.user)
+
+    @mock.patch("bonds.views.get_gleif_response")
+    def test_repeated_create_does_not_look_up_legal_name_or_duplicate_bond(self, get_gleif_response_mock):
+
+        response = self.client.post(path="/bonds/", data=self.bond)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, "Bond already exists.")
+        self.assertEqual(Bond.objects.filter(user=self.user).count(), 1)
+        get_gleif_response_mock.assert_not_called()
+
+    @mock.patch("bonds.views.get_gleif_response")
+    def test_create_with_existing_isin_updates_bond(self, get_gleif_response_mock):
+
+        response = self.client.post(path="/bonds/", data=dict(self.bond, size=250000))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, "Bond successfully updated.")
+        self.assertEqual(Bond.objects.get(user=self.user, isin="FR0000131104").size, 250000)
+        get_gleif_response_mock.assert_not_called()
+
+    def test_retry_with_idempotency_key_replays_stored_response(self):
+
+        response = self.client.post(path="/bonds/", data=dict(self.bond, size=250000), HTTP_IDEMPOTENCY_KEY="abc")
+        self.assertEqual(response.data, "Bond successfully updated.")
+        self.assertEqual(IdempotencyKey.objects.filter(user=self.user, key="abc").count(), 1)
+
+        response = self.client.post(path="/bonds/", data=dict(self.bond, size=250000), HTTP_IDEMPOTENCY_KEY="abc")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, "Bond successfully updated.")
+
+    def test_expired_idempotency_key_is_processed_again(self):
+
+        self.client.post(path="/bonds/", data=self.bond, HTTP_IDEMPOTENCY_KEY="abc")
+        self.client.post(path="/bonds/", data=self.bond, HTTP_IDEMPOTENCY_KEY="def")
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(hours=25))
+
+        # Requests with other keys don't purge expired keys
+        self.client.post(path="/bonds/", data=self.bond, HTTP_IDEMPOTENCY_KEY="ghi")
+        self.assertEqual(IdempotencyKey.objects.count(), 3)
+
+        # Reusing an expired key processes the request again, and purges every expired key
+        response = self.client.post(path="/bonds/", data=dict(self.bond, size=300000), HTTP_IDEMPOTENCY_KEY="abc")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, "Bond successfully updated.")
+        self.assertEqual(sorted(IdempotencyKey.objects.values_list("key", flat=True)), ["abc", "ghi"])
+
+    def test_purge_command_deletes_only_expired_idempotency_keys(self):
+
+        self.client.post(path="/bonds/", data=self.bond, HTTP_IDEMPOTENCY_KEY="abc")
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(hours=25))
+        self.client.post(path="/bonds/", data=self.bond, HTTP_IDEMPOTENCY_KEY="def")
+
+        output = io.StringIO()
+        call_command("purge_idempotency_keys", stdout=output)
+        self.assertEqual(output.getvalue().strip(), "Purged 1 expired idempotency keys")
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["def"])
+
+    def test_reusing_idempotency_key_for_a_different_request_returns_status_code_422(self):
+
+        self.client.post(path="/bonds/", data=self.bond, HTTP_IDEMPOTENCY_KEY="abc")
+
+        response = self.client.post(path="/bonds/", data=dict(self.bond, size=250000), HTTP_IDEMPOTENCY_KEY="abc")
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Bond.objects.get(user=self.user, isin="FR0000131104").size, 100000000)
+
+
+class BondsThrottleAPITest(APITestCase):
+
+    def setUp(self):
+
+        self.user = User.objects.create_user(username="test_user_1", password="djy6T6W8ki$")
+        self.client.force_authenticate(user=self.user)
+
+    @mock.patch.dict(UserRateThrottle.THROTTLE_RATES, {"bonds_read": "2/minute"})
+    def test_status_429_with_retry_after_returned_when_user_exceeds_rate(self):
+
+        self.assertEqual(self.client.get(path="/bonds/").status_code, 200)
+        self.assertEqual(self.client.get(path="/bonds/analytics/").status_code, 200)
+
+        response = self.client.get(path="/bonds/")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+        # The write rate is separate from the read rate
+        response = self.client.post(path="/bonds/", data={"lei": "R0MUWSFPU8MPRO8K5P84"})
+        self.assertEqual(response.status_code, 400)
+
+        # Other users are not affected
+        other_user = User.objects.create_user(username="test_user_2", password="dY6G4FmAkyuS")
+        self.client.force_authenticate(user=other_user)
+        self.assertEqual(self.client.get(path="/bonds/").status_code, 200)
+
+
+class SharedLocMemCache(LocMemCache):
+    """Stands in for memcached in tests, where there is only one process to share the cache between"""
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                           "shared": {"BACKEND": "bonds.tests.SharedLocMemCache", "LOCATION": "shared"}})
+@mock.patch.object(APIView, "authentication_classes", [CachedTokenAuthentication])
+class CachesTest(APITestCase):
+
+    def setUp(self):
+
+        cache.clear()
+        self.user = User.objects.create_user(username="test_user_1", password="djy6T6W8ki$")
+        self.token = Token.objects.create(user=self.user)
+
+        for isin, lei, legal_name in [("FR0000131104", "R0MUWSFPU8MPRO8K5P83", "BNP PARIBAS"),
+                                      ("US0378331005", "HWUPKR0MPOU8FGXBT394", "APPLE INC."),
+                                      ("GB0003HVGHA5", "HWUPKR0MPOU8FGXBT394", "APPLE INC.")]:
+            Bond.objects.create(isin=isin, size=100000000, currency="EUR", maturity=date(2025, 2, 28),
+                                lei=lei, legal_name=legal_name, user=self.user)
+
+    def tearDown(self):
+
+        cache.clear()
+
+    def test_warm_up_loads_tokens_into_the_shared_cache(self):
+
+        stats = warm_up_tokens(time_budget=10, memory_budget=1024 * 1024)
+        self.assertEqual(stats["tokens"], 1)
+        self.assertGreater(stats["bytes"], 0)
+        self.assertEqual(get_cached_token(self.token.key), (self.user.id, True))
+
+    def test_warm_up_loads_legal_names(self):
+
+        stats = warm_up_legal_names(time_budget=10, memory_budget=1024 * 1024)
+        self.assertEqual(stats["legal_names"], 2)
+        self.assertGreater(stats["bytes"], 0)
+        self.assertEqual(get_cached_legal_name("R0MUWSFPU8MPRO8K5P83"), "BNP PARIBAS")
+        self.assertEqual(get_cached_legal_name("HWUPKR0MPOU8FGXBT394"), "APPLE INC.")
+
+    def test_warm_up_stops_when_time_budget_is_used(self):
+
+        self.assertEqual(warm_up_tokens(time_budget=0, memory_budget=1024 * 1024), {"tokens": 0, "bytes": 0})
+        self.assertEqual(warm_up_legal_names(time_budget=0, memory_budget=1024 * 1024), {"legal_names": 0, "bytes": 0})
+
+    def test_warm_up_caches_most_used_legal_names_first_when_memory_budget_is_small(self):
+
+        # A budget for about one legal name only caches the most used one, Apple's
+        stats = warm_up_legal_names(time_budget=10, memory_budget=99)
+        self.assertEqual(stats["legal_names"], 1)
+        self.assertEqual(get_cached_legal_name("HWUPKR0MPOU8FGXBT394"), "APPLE INC.")
+        self.assertIsNone(get_cached_legal_name("R0MUWSFPU8MPRO8K5P83"))
+
+    def test_warm_up_stops_when_memory_budget_is_used(self):
+
+        self.assertEqual(warm_up_tokens(time_budget=10, memory_budget=1), {"tokens": 0, "bytes": 0})
+        self.assertEqual(warm_up_legal_names(time_budget=10, memory_budget=1), {"legal_names": 0, "bytes": 0})
+        self.assertIsNone(get_cached_token(self.token.key))
+
+    def test_warm_up_on_startup_only_loads_legal_names_when_enabled(self):
+
+        with override_settings(BONDS_WARM_UP_ON_STARTUP=False):
+            warm_up_on_startup()
+        self.assertIsNone(get_cached_legal_name("R0MUWSFPU8MPRO8K5P83"))
+
+        with override_settings(BONDS_WARM_UP_ON_STARTUP=True):
+            warm_up_on_startup()
+        self.assertEqual(get_cached_legal_name("R0MUWSFPU8MPRO8K5P83"), "BNP PARIBAS")
+        self.assertIsNone(get_cached_token(self.token.key))
+
+    def test_warm_up_tokens_command(self):
+
+        output = io.StringIO()
+        call_command("warm_up_tokens", stdout=output)
+        self.assertIn("Cached 1 tokens", output.getvalue())
+        self.assertEqual(get_cached_token(self.token.key), (self.user.id, True))
+
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                                       "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            with self.assertRaises(CommandError):
+                call_command("warm_up_tokens", stdout=io.StringIO())
+
+    def test_deleted_token_is_rejected_even_when_cached(self):
+
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token.key)
+        self.assertEqual(self.client.get(path="/bonds/").status_code, 200)
+        self.assertIsNotNone(get_cached_token(self.token.key))
+
+        self.token.delete()
+        self.assertEqual(self.client.get(path="/bonds/").status_code, 401)
+
+    def test_token_cache_requires_a_shared_cache_backend(self):
+
+        for backend in ["django.core.cache.backends.locmem.LocMemCache",
+                        "django.core.cache.backends.db.DatabaseCache"]:
+            with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                                           "shared": {"BACKEND": backend, "LOCATION": "bonds_shared_cache"}}):
+                with self.assertRaises(ImproperlyConfigured):
+                    CachedTokenAuthentication()
+
+    def test_cached_token_authenticates_its_user(self):
+
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token.key)
+        Bond.objects.exclude(isin="FR0000131104").delete()
+        self.assertEqual(self.client.get(path="/bonds/", data={"fields": "isin"}).data, [{"isin": "FR0000131104"}])
+
+        # The second request is authenticated from the cache, without loading the token or user
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path="/bonds/", data={"fields": "isin"})
+        self.assertEqual(response.data, [{"isin": "FR0000131104"}])
+        self.assertFalse([query for query in queries.captured_queries
+                          if "authtoken_token" in query["sql"] or "auth_user" in query["sql"]])
+
+    def test_deactivated_user_is_rejected_even_when_cached(self):
+
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token.key)
+        self.assertEqual(self.client.get(path="/bonds/").status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(path="/bonds/").status_code, 401)
+
+    @mock.patch("bonds.views.get_gleif_response")
+    def test_cached_legal_name_is_used_instead_of_gleif(self, get_gleif_response_mock):
+
+        cache_legal_names({"549300FL0LHI0TEZ8V48": "ORACLE SYSTEMS CORPORATION"})
+        self.client.force_authenticate(user=self.user)
+
+        bond = {
+            "isin": "US68389XAP06",
+            "size": 100000000,
+            "currency": "USD",
+            "maturity": "2025-02-28",
+            "lei": "549300FL0LHI0TEZ8V48"
+        }
+
+        response = self.client.post(path="/bonds/", data=bond)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Bond.objects.get(isin="US68389XAP06").legal_name, "ORACLE SYSTEMS CORPORATION")
+        get_gleif_response_mock.assert_not_called()
+
+
+class BondAnalyticsAPITest(APITestCase):
+
+    # Helper method to create a bond for the test user without looking up its legal name
+    def create_bond(self, isin, size, currency, maturity):
+
+        Bond.objects.create(isin=isin, size=size, currency=currency, maturity=maturity,
+                            lei="R0MUWSFPU8MPRO8K5P83", legal_name="BNP PARIBAS", user=self.user)
+
+    def setUp(self):
+
+        cache.clear()
+        self.user = User.objects.create_user(username="test_user_1", password="djy6T6W8ki$")
+        self.client.force_authenticate(user=self.user)
+
+    def test_analytics_for_user_with_no_bonds(self):
+
+        response = self.client.get(path="/bonds/analytics/", data={"as_of": "2021-01-01"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 0)
+        self.assertEqual(response.data["total_size"], 0)
+        self.assertIsNone(response.data["weighted_average_maturity"])
+        self.assertEqual(response.data["currencies"], {})
+
+    def test_bonds_are_bucketed_by_time_to_maturity_and_currency(self):
+
+        self.create_bond("FR0000131104", 100, "EUR", date(2021, 7, 1))
+        self.create_bond("FR0000131105", 300, "EUR", date(2025, 1, 1))
+        self.create_bond("GB0003HVGHA5", 50, "GBP", date(2020, 6, 1))
+
+        response = self.client.get(path="/bonds/analytics/", data={"as_of": "2021-01-01"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(response.data["total_size"], 450)
+
+        ladder = {bucket["bucket"]: bucket["size"] for bucket in response.data["ladder"]}
+        self.assertEqual(ladder["matured"], 50)
+        self.assertEqual(ladder["0-1y"], 100)
+        self.assertEqual(ladder["3-5y"], 300)
+        self.assertEqual(ladder["30y+"], 0)
+
+        eur = response.data["currencies"]["EUR"]
+        self.assertEqual(eur["count"], 2)
+        self.assertEqual(eur["total_size"], 400)
+        self.assertEqual(response.data["currencies"]["GBP"]["total_size"], 50)
+        self.assertIsNone(response.data["currencies"]["GBP"]["weighted_average_maturity"])
+
+        # Matured bonds are excluded from the weighted average maturity
+        expected_wam = (100 * 181 + 300 * 1461) / 400 / 365.25
+        self.assertAlmostEqual(response.data["weighted_average_maturity"], expected_wam, places=4)
+        self.assertAlmostEqual(eur["weighted_average_maturity"], expected_wam, places=4)
+
+    def test_analytics_are_recomputed_when_a_bond_is_added(self):
+
+        self.create_bond("FR0000131104", 100, "EUR", date(2025, 2, 28))
+        response = self.client.get(path="/bonds/analytics/", data={"as_of": "2021-01-01"})
+        self.assertEqual(response.data["total_size"], 100)
+
+        self.create_bond("GB0003HVGHA5", 200, "GBP", date(2022, 6, 6))
+        response = self.client.get(path="/bonds/analytics/", data={"as_of": "2021-01-01"})
+        self.assertEqual(response.data["total_size"], 300)
+
+    def test_analytics_are_recomputed_when_a_bond_is_updated_or_deleted(self):
+
+        self.create_bond("FR0000131104", 100, "EUR", date(2025, 2, 28))
+        self.create_bond("GB0003HVGHA5", 200, "GBP", date(2022, 6, 6))
+        response = self.client.get(path="/bonds/analytics/", data={"as_of": "2021-01-01"})
+        self.assertEqual(response.data["total_size"], 300)
+
+        bond = Bond.objects.get(isin="FR0000131104")
+        bond.size = 1000
+        bond.save()
+        response = self.client.get(path="/bonds/analytics/", data={"as_of": "2021-01-01"})
+        self.assertEqual(response.data["total_size"], 1200)
+
+        bond.delete()
+        response = self.client.get(path="/bonds/analytics/", data={"as_of": "2021-01-01"})
+        self.assertEqual(response.data["total_size"], 200)
+
+    def test_invalid_as_of_term_returns_status_code_400(self):
+
+        response = self.client.get(path="/bonds/analytics/", data={"as_of": "2021-13-01"})
+        self.assertEqual(response.status_code, 400)
+
+
+class BondsFieldsAPITest(APITestCase):
+
+    def setUp(self):
+
+        self.user = User.objects.create_user(username="test_user_1", password="djy6T6W8ki$")
+        self.client.force_authenticate(user=self.user)
+
+        Bond.objects.create(isin="FR0000131104", size=100000000, currency="EUR", maturity=date(2025, 2, 28),
+                            lei="R0MUWSFPU8MPRO8K5P83", legal_name="BNP PARIBAS", user=self.user)
+
+    def test_only_requested_fields_are_returned(self):
+
+        response = self.client.get(path="/bonds/", data={"fields": "isin,legal_name"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{"isin": "FR0000131104", "legal_name": "BNP PARIBAS"}])
+
+        response = self.client.get(path="/bonds/", data={"fields": "maturity", "currency": "EUR"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{"maturity": "2025-02-28"}])
+
+    def test_all_fields_are_returned_when_fields_is_empty(self):
+
+        response = self.client.get(path="/bonds/", data={"fields": ""})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data[0]), ["isin", "size", "currency", "maturity", "lei", "legal_name"])
+
+    def test_fields_can_be_combined_with_change_feed(self):
+
+        response = self.client.get(path="/bonds/", data={"fields": "isin", "since": ""})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["bonds"], [{"isin": "FR0000131104"}])
+        self.assertTrue(response.data["next"])
+
+    def test_unknown_field_returns_status_code_400(self):
+
+        response = self.client.get(path="/bonds/", data={"fields": "isin,user"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, "Fields must be chosen from: isin, size, currency, maturity, lei, legal_name")
+
+
+class BondsChangeFeedAPITest(APITestCase):
+
+    # Helper method to create a bond for the test user without looking up its legal name
+    def create_bond(self, isin):
+
+        return Bond.objects.create(isin=isin, size=100000000, currency="EUR", maturity=date(2025, 2, 28),
+                                   lei="R0MUWSFPU8MPRO8K5P83", legal_name="BNP PARIBAS", user=self.user)
+
+    def setUp(self):
+
+        self.user = User.objects.create_user(username="test_user_1", password="djy6T6W8ki$")
+        self.client.force_authenticate(user=self.user)
+
+    def test_empty_since_token_returns_all_bonds_and_a_new_token(self):
+
+        self.create_bond("FR0000131104")
+        self.create_bond("GB0003HVGHA5")
+
+        response = self.client.get(path="/bonds/", data={"since": ""})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([bond["isin"] for bond in response.data["bonds"]], ["FR0000131104", "GB0003HVGHA5"])
+        self.assertTrue(response.data["next"])
+
+    def test_only_bonds_changed_after_the_token_are_returned(self):
+
+        first_bond = self.create_bond("FR0000131104")
+        second_bond = self.create_bond("GB0003HVGHA5")
+
+        # Move the bonds' changes back in time, outside the safety window
+        Bond.objects.filter(id=first_bond.id).update(updated_at=timezone.now() - timedelta(hours=2))
+        Bond.objects.filter(id=second_bond.id).update(updated_at=timezone.now() - timedelta(hours=1))
+        token = self.client.get(path="/bonds/", data={"since": ""}).data["next"]
+
+        # Nothing has changed since the token was issued, so no bonds are returned, along with the same token
+        response = self.client.get(path="/bonds/", data={"since": token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["bonds"], [])
+        self.assertEqual(response.data["next"], token)
+
+        # Add a bond and update an existing one, then check only those two are returned
+        self.create_bond("US0378331005")
+        first_bond.size = 200000000
+        first_bond.save()
+
+        response = self.client.get(path="/bonds/", data={"since": token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([bond["isin"] for bond in response.data["bonds"]], ["US0378331005", "FR0000131104"])
+        self.assertEqual(response.data["bonds"][1]["size"], 200000000)
+
+    def test_idle_polls_return_nothing_once_the_safety_window_has_passed(self):
+
+        self.create_bond("FR0000131104")
+
+        # The bond changed within the safety window, so the token is from before it and the bond is returned again
+        token = self.client.get(path="/bonds/", data={"since": ""}).data["next"]
+        response = self.client.get(path="/bonds/", data={"since": token})
+        self.assertEqual([bond["isin"] for bond in response.data["bonds"]], ["FR0000131104"])
+
+        # Once the window has passed the token moves up to the bond, so polling an idle book returns nothing
+        with mock.patch("django.utils.timezone.now", return_value=timezone.now() + timedelta(minutes=1)):
+            token = self.client.get(path="/bonds/", data={"since": token}).data["next"]
+            response = self.client.get(path="/bonds/", data={"since": token})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["bonds"], [])
+        self.assertEqual(response.data["next"], token)
+
+    def test_bonds_committed_late_within_the_safety_window_are_returned(self):
+
+        self.create_bond("FR0000131104")
+        token = self.client.get(path="/bonds/", data={"since": ""}).data["next"]
+
+        # A bond timestamped just before the token, but committed after it was handed out, is still returned
+        late_bond = self.create_bond("GB0003HVGHA5")
+        Bond.objects.filter(id=late_bond.id).update(
+            updated_at=Bond.objects.get(isin="FR0000131104").updated_at - timedelta(seconds=1))
+
+        response = self.client.get(path="/bonds/", data={"since": token})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("GB0003HVGHA5", [bond["isin"] for bond in response.data["bonds"]])
+
+    def test_invalid_since_token_returns_status_code_400(self):
+
+        response = self.client.get(path="/bonds/", data={"since": "not-a-token"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, "The 'since' token is invalid.")
+
+
+class BondExportTest(APITestCase):
+
+    def setUp(self):
+
+        self.user = User.objects.create_user(username="test_user_1", password="djy6T6W8ki$")
+        self.client.force_authenticate(user=self.user)
+
+        for isin in ["FR0000131104", "GB0003HVGHA5", "US0378331005"]:
+            Bond.objects.create(isin=isin, size=100000000, currency="EUR", maturity=date(2025, 2, 28),
+                                lei="R0MUWSFPU8MPRO8K5P83", legal_name="BNP PARIBAS", user=self.user)
+
+        # Create a bond for another user, which should never be exported
+        other_user = User.objects.create_user(username="test_user_2", password="dY6G4FmAkyuS")
+        Bond.objects.create(isin="XS0000000000", size=1, currency="GBP", maturity=date(2022, 6, 6),
+                            lei="F32G12M10LW6RUUWKX69", legal_name="OTHER", user=other_user)
+
+    def test_bonds_are_exported_as_arrow_stream(self):
+
+        response = self.client.get(path="/bonds/export/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/vnd.apache.arrow.stream")
+
+        table = pa.ipc.open_stream(b"".join(response.streaming_content)).read_all()
+        self.assertEqual(table.column("isin").to_pylist(), ["FR0000131104", "GB0003HVGHA5", "US0378331005"])
+        self.assertEqual(table.column("size").to_pylist(), [100000000] * 3)
+        self.assertEqual(table.column("maturity").to_pylist(), [date(2025, 2, 28)] * 3)
+        self.assertEqual(table.column("legal_name").to_pylist(), ["BNP PARIBAS"] * 3)
+
+    def test_bonds_are_exported_as_parquet(self):
+
+        response = self.client.get(path="/bonds/export/", data={"file_format": "parquet"})
+        self.assertEqual(response.status_code, 200)
+
+        table = pq.read_table(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.column("lei").to_pylist(), ["R0MUWSFPU8MPRO8K5P83"] * 3)
+
+    def test_unsupported_file_format_returns_status_code_400(self):
+
+        response = self.client.get(path="/bonds/export/", data={"file_format": "csv"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, "File format must be one of: arrow, parquet")
+
+    def test_bonds_are_read_in_batches(self):
+
+        batches = list(iter_record_batches(self.user.id, batch_size=2))
+        self.assertEqual([batch.num_rows for batch in batches], [2, 1])
+
+    def test_export_command_writes_parquet_file_with_a_row_group_per_batch(self):
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bonds.parquet")
+            call_command("export_bonds", "test_user_1", path, batch_size=2, stdout=io.StringIO())
+
+            parquet_file = pq.ParquetFile(path)
+            self.assertEqual(parquet_file.metadata.num_rows, 3)
+            self.assertEqual(parquet_file.num_row_groups, 2)
 
 
 class RegisterTest(APITestCase):
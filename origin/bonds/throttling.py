@@ -0,0 +1,34 @@
+from rest_framework.throttling import UserRateThrottle
+
+from .ratelimit import acquire_token
+
+
+class BucketRateThrottle(UserRateThrottle):
+    """
+    Per-user throttle kept in a shared token bucket rather than as request history in a cache, so the rate applies
+    across all worker processes and each request costs a single conditional UPDATE of the user's bucket. A user may
+    make a burst of up to the whole rate at once, after which requests are allowed at an even pace.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.retry_after = acquire_token(self.get_cache_key(request, view), self.num_requests / self.duration,
+                                         self.num_requests)
+        return self.retry_after == 0
+
+    def wait(self):
+        return self.retry_after
+
+
+class BondsReadThrottle(BucketRateThrottle):
+    """Per-user throttle for reading bonds"""
+
+    scope = "bonds_read"
+
+
+class BondsWriteThrottle(BucketRateThrottle):
+    """Per-user throttle for creating bonds"""
+
+    scope = "bonds_write"
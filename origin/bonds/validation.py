@@ -0,0 +1,92 @@
+from datetime import datetime
+import re
+
+
+# Active ISO 4217 currency codes, plus the precious metal and SDR codes which bonds may be denominated in
+CURRENCY_CODES = frozenset([
+    "AED", "AFN", "ALL", "AMD", "ANG", "AOA", "ARS", "AUD", "AWG", "AZN", "BAM", "BBD", "BDT", "BGN", "BHD", "BIF",
+    "BMD", "BND", "BOB", "BOV", "BRL", "BSD", "BTN", "BWP", "BYN", "BZD", "CAD", "CDF", "CHE", "CHF", "CHW", "CLF",
+    "CLP", "CNY", "COP", "COU", "CRC", "CUC", "CUP", "CVE", "CZK", "DJF", "DKK", "DOP", "DZD", "EGP", "ERN", "ETB",
+    "EUR", "FJD", "FKP", "GBP", "GEL", "GHS", "GIP", "GMD", "GNF", "GTQ", "GYD", "HKD", "HNL", "HRK", "HTG", "HUF",
+    "IDR", "ILS", "INR", "IQD", "IRR", "ISK", "JMD", "JOD", "JPY", "KES", "KGS", "KHR", "KMF", "KPW", "KRW", "KWD",
+    "KYD", "KZT", "LAK", "LBP", "LKR", "LRD", "LSL", "LYD", "MAD", "MDL", "MGA", "MKD", "MMK", "MNT", "MOP", "MRU",
+    "MUR", "MVR", "MWK", "MXN", "MXV", "MYR", "MZN", "NAD", "NGN", "NIO", "NOK", "NPR", "NZD", "OMR", "PAB", "PEN",
+    "PGK", "PHP", "PKR", "PLN", "PYG", "QAR", "RON", "RSD", "RUB", "RWF", "SAR", "SBD", "SCR", "SDG", "SEK", "SGD",
+    "SHP", "SLE", "SLL", "SOS", "SRD", "SSP", "STN", "SVC", "SYP", "SZL", "THB", "TJS", "TMT", "TND", "TOP", "TRY",
+    "TTD", "TWD", "TZS", "UAH", "UGX", "USD", "USN", "UYI", "UYU", "UYW", "UZS", "VED", "VES", "VND", "VUV", "WST",
+    "XAF", "XAG", "XAU", "XCD", "XDR", "XOF", "XPD", "XPF", "XPT", "XSU", "XUA", "YER", "ZAR", "ZMW", "ZWL"
+])
+
+LEI_PATTERN = re.compile(r"[0-9A-Z]{18}[0-9]{2}")
+ISIN_PATTERN = re.compile(r"[A-Z]{2}[0-9A-Z]{9}[0-9]")
+SIZE_PATTERN = re.compile(r"[0-9]{1,10}")
+DATE_PATTERN = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
+
+# Largest size which can be stored in Bond.size
+MAX_SIZE = 2147483647
+
+LEI_ERROR = "LEI code is invalid"
+ISIN_ERROR = "ISIN is invalid"
+CURRENCY_ERROR = "Currency must be an ISO 4217 currency code. For example: EUR"
+SIZE_ERROR = "Size must be a positive integer"
+MATURITY_ERROR = "Dates must be given in the following format: YYYY-mm-dd. For example: 2023-06-07"
+
+
+def is_valid_lei(code):
+    """Returns True if a LEI code is 20 characters and passes the ISO 17442 (ISO 7064 MOD 97-10) checksum"""
+
+    if not isinstance(code, str) or not LEI_PATTERN.fullmatch(code):
+        return False
+    return int("".join(str(int(character, 36)) for character in code)) % 97 == 1
+
+
+def is_valid_isin(code):
+    """Returns True if an ISIN is 12 characters, starts with a country code and passes the ISO 6166 check digit"""
+
+    if not isinstance(code, str) or not ISIN_PATTERN.fullmatch(code):
+        return False
+
+    total = 0
+    for position, digit in enumerate(reversed("".join(str(int(character, 36)) for character in code))):
+        digit = int(digit) * 2 if position % 2 == 1 else int(digit)
+        total += digit - 9 if digit > 9 else digit
+    return total % 10 == 0
+
+
+def is_valid_size(size):
+    """Returns True if a size is a positive integer, given as a number or string of digits, that fits in Bond.size"""
+
+    size = str(size)
+    return bool(SIZE_PATTERN.fullmatch(size)) and 0 < int(size) <= MAX_SIZE
+
+
+def is_valid_date(date):
+    """Returns True if a date is a real calendar date in the format YYYY-mm-dd"""
+
+    date = str(date)
+    if not DATE_PATTERN.fullmatch(date):
+        return False
+    try:
+        datetime.strptime(date, "%Y-%m-%d")
+        return True
+    except ValueError:
+        return False
+
+
+def validate_bond(bond):
+    """
+    Validates a single bond dict, as posted to /bonds/, without any network or database access. Returns the first
+    error message, or None if it is valid.
+    """
+
+    if not is_valid_lei(bond.get("lei")):
+        return LEI_ERROR
+    if not is_valid_isin(bond.get("isin")):
+        return ISIN_ERROR
+    if str(bond.get("currency")) not in CURRENCY_CODES:
+        return CURRENCY_ERROR
+    if not is_valid_size(bond.get("size")):
+        return SIZE_ERROR
+    if not is_valid_date(bond.get("maturity")):
+        return MATURITY_ERROR
+    return None
@@ -1,16 +1,50 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import authentication_classes, permission_classes
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.encoding import force_bytes, force_text
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+import hashlib
+import json
+import math
 import requests
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from .models import Bond
+from .analytics import get_book_analytics
+from .caches import cache_legal_names, get_cached_legal_name
+from .export import EXPORT_FORMATS, iter_export_chunks
+from .models import Bond, IdempotencyKey
+from .ratelimit import wait_for_token
+from .throttling import BondsReadThrottle, BondsWriteThrottle
+from .validation import validate_bond
+
+
+# Fields of a bond returned by GET /bonds/, in the order they are returned
+BOND_FIELDS = ["isin", "size", "currency", "maturity", "lei", "legal_name"]
+
+# Change feed cursors are never later than this long before now, so that writes which are timestamped before a
+# cursor but commit after it is handed out are still returned by the next sync
+CHANGE_FEED_SAFETY_WINDOW = timedelta(seconds=5)
+
+# How long the response to a request with an Idempotency-Key header is replayed for
+IDEMPOTENCY_KEY_LIFETIME = timedelta(hours=24)
 
 
 class Bonds(APIView):
     """/bonds/ endpoint"""
 
+    def get_throttles(self):
+        """Creating bonds is throttled separately, and at a lower rate, than reading them"""
+
+        if self.request.method == "POST":
+            return [BondsWriteThrottle()]
+        return [BondsReadThrottle()]
+
     def get(self, request):
         """GET method"""
 
@@ -52,52 +86,243 @@ class Bonds(APIView):
         if legal_name_term:
             query_set = query_set.filter(legal_name=legal_name_term.replace('\n', ''))
 
+        # In change feed mode only return bonds changed after the given cursor, along with a cursor for the next sync.
+        # An empty cursor returns every bond. updated_at is set before a write commits, so a bond can commit after a
+        # cursor later than its updated_at was handed out. Cursors are therefore never later than a safety window
+        # before now, so bonds changed within the window are returned again, and clients should dedupe them by isin.
+        since_term = request.query_params.get("since")
+        if since_term is not None:
+            since_term = since_term.replace('\n', '')
+            if since_term:
+                try:
+                    since_updated_at = decode_change_cursor(since_term)
+                except ValueError:
+                    return Response(status=400, data="The 'since' token is invalid.")
+                query_set = query_set.filter(updated_at__gt=since_updated_at)
+            query_set = query_set.order_by("updated_at", "id")
+            latest_cursor = timezone.now() - CHANGE_FEED_SAFETY_WINDOW
+
+        # Only select and return the requested fields, or every field if none are given
+        fields_term = request.query_params.get("fields")
+        fields = BOND_FIELDS
+        if fields_term:
+            fields = list(dict.fromkeys(field.strip() for field in fields_term.replace('\n', '').split(",")
+                                        if field.strip())) or BOND_FIELDS
+            if any(field not in BOND_FIELDS for field in fields):
+                return Response(status=400, data="Fields must be chosen from: " + ", ".join(BOND_FIELDS))
+
+        # The change feed cursor is built from the updated_at of the last bond, so select that too
+        selected_fields = fields + ["updated_at"] if since_term is not None else fields
+        field_count = len(fields)
+        format_maturity = "maturity" in fields
+
         return_data = []
-        for bond in query_set:
-            bond_dict = {
-                "isin": bond.isin,
-                "size": bond.size,
-                "currency": bond.currency,
-                "maturity": bond.maturity.strftime("%Y-%m-%d"),
-                "lei": bond.lei,
-                "legal_name": bond.legal_name
-            }
+        last_row = None
+        for row in query_set.values_list(*selected_fields):
+            last_row = row
+            bond_dict = dict(zip(fields, row[:field_count]))
+            if format_maturity:
+                bond_dict["maturity"] = bond_dict["maturity"].strftime("%Y-%m-%d")
             return_data.append(bond_dict)
 
+        if since_term is not None:
+            next_cursor = encode_change_cursor(min(last_row[-1], latest_cursor)) if last_row else since_term
+            return Response(status=200, data={"bonds": return_data, "next": next_cursor})
+
         return Response(status=200, data=return_data)
 
     def post(self, request):
         """POST method"""
 
+        # Reject invalid bonds before doing any database or network work
+        validation_error = validate_bond(request.data)
+        if validation_error:
+            return Response(status=400, data=validation_error)
+
+        # Requests sent with an Idempotency-Key header are only processed once, and retries replay the stored response
+        idempotency_key = request.META.get("HTTP_IDEMPOTENCY_KEY")
+        if not idempotency_key:
+            return self.create_or_update_bond(request)
+
+        if len(idempotency_key) > 255:
+            return Response(status=400, data="Idempotency-Key must be at most 255 characters.")
+
+        request_fingerprint = get_request_fingerprint(request.data)
+        stored_key = IdempotencyKey.objects.filter(user=request.user, key=idempotency_key).first()
+
+        # An expired key is processed again. Expired keys are normally purged by the purge_idempotency_keys command,
+        # so finding one means it hasn't run for a while and it is worth purging them all now.
+        if stored_key and stored_key.created_at < timezone.now() - IDEMPOTENCY_KEY_LIFETIME:
+            purge_expired_idempotency_keys()
+            stored_key = None
+
+        if stored_key:
+            if stored_key.request_fingerprint != request_fingerprint:
+                return Response(status=422, data="Idempotency-Key has already been used for a different request.")
+            return Response(status=stored_key.response_status, data=json.loads(stored_key.response_data))
+
+        response = self.create_or_update_bond(request)
+
+        # Server errors, such as GLEIF being unavailable, are not stored so that they can be retried
+        if response.status_code < 500:
+            try:
+                with transaction.atomic():
+                    IdempotencyKey.objects.create(key=idempotency_key,
+                                                  user=request.user,
+                                                  request_fingerprint=request_fingerprint,
+                                                  response_status=response.status_code,
+                                                  response_data=json.dumps(response.data))
+            except IntegrityError:
+                # A concurrent request with the same key stored its response first
+                pass
+
+        return response
+
+    def create_or_update_bond(self, request):
+        """Creates a bond, or updates the user's existing bond with the same ISIN"""
+
         lei_code = request.data.get("lei")
-        if len(lei_code) != 20 or not lei_code.isalnum():
-            return Response(status=400, data="LEI code is invalid")
+        isin = request.data.get("isin")
+        existing_bond = Bond.objects.filter(user=request.user, isin=isin).first()
+
+        # Only look up the legal name if it isn't already known from the existing bond or the cache
+        if existing_bond and existing_bond.lei == lei_code:
+            legal_name = existing_bond.legal_name
+        else:
+            legal_name = get_cached_legal_name(lei_code)
+
+        if legal_name is None:
+            try:
+                gleif_response = get_gleif_response(lei_code)
+            except GleifRateLimitExceeded as error:
+                return Response(status=503, data="Too many requests to the GLEIF API, please try again later.",
+                                headers={"Retry-After": str(math.ceil(error.retry_after))})
+
+            if gleif_response.status_code != 200:
+                return Response(status=500, data="Error obtaining legal name from GLEIF API")
+
+            gleif_response_json = gleif_response.json()
+            if len(gleif_response_json) == 0:
+                return Response(status=404, data="Could not find entity for the given LEI code")
+
+            legal_name = gleif_response_json[0]["Entity"]["LegalName"]["$"]
+            cache_legal_names({lei_code: legal_name})
+
+        bond_values = {
+            "size": request.data.get("size"),
+            "currency": request.data.get("currency"),
+            "maturity": request.data.get("maturity"),
+            "lei": lei_code,
+            "legal_name": legal_name
+        }
+
+        if existing_bond and bond_matches_values(existing_bond, bond_values):
+            return Response("Bond already exists.")
+
+        bond, created = Bond.objects.update_or_create(user=request.user, isin=isin, defaults=bond_values)
+        if created:
+            return Response("Bond successfully created.")
+        return Response("Bond successfully updated.")
+
+
+class BondAnalytics(APIView):
+    """/bonds/analytics/ endpoint"""
+
+    throttle_classes = [BondsReadThrottle]
+
+    def get(self, request):
+        """GET method"""
+
+        as_of_term = request.query_params.get("as_of")
+        as_of_date = None
+        if as_of_term:
+
+            # Convert the date term from a string to a date object before computing the analytics
+            try:
+                as_of_date = datetime.strptime(as_of_term.replace('\n', ''), "%Y-%m-%d").date()
+            except ValueError:
+                return Response(status=400, data="Dates must be given in the following format: YYYY-mm-dd. For "
+                                                 "example: 2023-06-07")
+
+        return Response(status=200, data=get_book_analytics(request.user.id, as_of_date))
+
+
+class BondExport(APIView):
+    """/bonds/export/ endpoint"""
+
+    throttle_classes = [BondsReadThrottle]
+
+    def get(self, request):
+        """GET method"""
+
+        # The file format is not passed as 'format', as DRF reserves that query parameter for content negotiation
+        export_format = request.query_params.get("file_format", "arrow").replace('\n', '')
+        if export_format not in EXPORT_FORMATS:
+            return Response(status=400, data="File format must be one of: " + ", ".join(EXPORT_FORMATS))
+
+        response = StreamingHttpResponse(iter_export_chunks(request.user.id, export_format),
+                                         content_type=EXPORT_FORMATS[export_format])
+        response["Content-Disposition"] = 'attachment; filename="bonds.{}"'.format(export_format)
+        return response
+
+
+def get_request_fingerprint(request_data):
+    """Returns a hash of the bond fields in a request, used to detect an Idempotency-Key being reused"""
+
+    bond_fields = {field: str(request_data.get(field)) for field in ["isin", "size", "currency", "maturity", "lei"]}
+    return hashlib.sha256(force_bytes(json.dumps(bond_fields, sort_keys=True))).hexdigest()
+
+
+def purge_expired_idempotency_keys():
+    """Deletes the stored responses of every expired Idempotency-Key, returning the number deleted"""
+
+    deleted_count, _ = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - IDEMPOTENCY_KEY_LIFETIME).delete()
+    return deleted_count
+
+
+def bond_matches_values(bond, bond_values):
+    """Returns True if the bond already has all of the given field values"""
+
+    try:
+        return all(getattr(bond, field) == Bond._meta.get_field(field).to_python(value)
+                   for field, value in bond_values.items())
+    except ValidationError:
+        return False
+
+
+def encode_change_cursor(updated_at):
+    """Encodes the updated_at which the change feed has synced up to as an opaque, URL safe token"""
+
+    return urlsafe_base64_encode(force_bytes(updated_at.isoformat()))
 
-        gleif_response = get_gleif_response(lei_code)
 
-        if gleif_response.status_code != 200:
-            return Response(status=500, data="Error obtaining legal name from GLEIF API")
+def decode_change_cursor(cursor):
+    """Decodes a change feed token into the updated_at which has been synced up to. Raises ValueError if invalid."""
 
-        gleif_response_json = gleif_response.json()
-        if len(gleif_response_json) == 0:
-            return Response(status=404, data="Could not find entity for the given LEI code")
+    try:
+        return datetime.fromisoformat(force_text(urlsafe_base64_decode(cursor)))
+    except (TypeError, UnicodeDecodeError, ValueError) as error:
+        raise ValueError("Invalid change cursor") from error
 
-        legal_name = gleif_response_json[0]["Entity"]["LegalName"]["$"]
 
-        new_bond = Bond(isin=request.data.get("isin"),
-                        size=request.data.get("size"),
-                        currency=request.data.get("currency"),
-                        maturity=request.data.get("maturity"),
-                        lei=request.data.get("lei"),
-                        legal_name=legal_name,
-                        user=request.user)
-        new_bond.save()
+class GleifRateLimitExceeded(Exception):
+    """Raised when the shared limit on requests to the GLEIF API has no capacity for another request"""
 
-        return Response("Bond successfully created.")
+    def __init__(self, retry_after):
+        super().__init__("GLEIF rate limit exceeded, retry after {:.1f} seconds".format(retry_after))
+        self.retry_after = retry_after
 
 
 def get_gleif_response(lei_code):
-    """Given a LEI code, returns the response when searching for the LEI code using the GLEIF API"""
+    """
+    Given a LEI code, returns the response when searching for the LEI code using the GLEIF API. Raises
+    GleifRateLimitExceeded if the request cannot be made within the shared GLEIF rate limit.
+    """
+
+    retry_after = wait_for_token("gleif", settings.GLEIF_REQUESTS_PER_SECOND, settings.GLEIF_BURST,
+                                 settings.GLEIF_MAX_WAIT)
+    if retry_after:
+        raise GleifRateLimitExceeded(retry_after)
 
     return requests.get("https://leilookup.gleif.org/api/v2/leirecords?lei=" + lei_code)
 
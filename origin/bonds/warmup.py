@@ -0,0 +1,153 @@
+from rest_framework.authtoken.models import Token
+from django.conf import settings
+from django.db import DatabaseError
+from collections import Counter
+import logging
+import pickle
+import time
+
+from .caches import LEGAL_NAME_KEY, TOKEN_KEY, cache_legal_names, cache_tokens
+from .models import Bond
+
+logger = logging.getLogger(__name__)
+
+
+# Number of entries written to the cache at once
+WARM_UP_BATCH_SIZE = 1000
+
+# Lower bounds on the size of each cache entry, used to limit how many rows are queried for a memory budget
+MIN_TOKEN_ENTRY_SIZE = 60
+MIN_LEGAL_NAME_ENTRY_SIZE = 50
+
+# Legal names are ranked by how often their LEI appears among this many recent bonds per legal name that could be cached
+RECENT_BONDS_PER_LEGAL_NAME = 4
+
+# Number of bonds counted between checks of the time budget
+TIME_CHECK_INTERVAL = 1000
+
+
+def entry_size(key, value):
+    """Estimates the memory used by a cache entry as the size of its key and pickled value"""
+
+    return len(key) + len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+class WarmUpBudget:
+    """Tracks the time and memory used while warming up caches"""
+
+    def __init__(self, time_budget, memory_budget):
+        self.deadline = time.monotonic() + time_budget
+        self.memory_budget = memory_budget
+        self.bytes_used = 0
+
+    def expired(self):
+        """Returns True once the time budget has been used up"""
+
+        return time.monotonic() > self.deadline
+
+    def spend(self, key, value):
+        """Returns True and counts the entry's memory if it can be cached within the budget, otherwise False"""
+
+        size = entry_size(key, value)
+        if self.expired() or self.bytes_used + size > self.memory_budget:
+            return False
+        self.bytes_used += size
+        return True
+
+
+def cache_within_budget(entries, cache_batch, budget):
+    """
+    Caches (key, value, item) entries, passing items to cache_batch in batches, until the entries or the budget run
+    out. Returns the number of entries cached and whether the budget ran out.
+    """
+
+    batch = []
+    cached_count = 0
+    budget_exhausted = False
+
+    for key, value, item in entries:
+        if not budget.spend(key, value):
+            budget_exhausted = True
+            break
+        batch.append(item)
+        if len(batch) == WARM_UP_BATCH_SIZE:
+            cache_batch(batch)
+            cached_count += len(batch)
+            batch = []
+
+    cache_batch(batch)
+    return cached_count + len(batch), budget_exhausted
+
+
+def count_recent_legal_names(bond_limit, budget):
+    """
+    Counts how often each (LEI code, legal name) pair appears among the most recently created bonds, reading at most
+    bond_limit bonds and stopping early if the time budget runs out
+    """
+
+    counts = Counter()
+    recent_bonds = Bond.objects.order_by("-id").values_list("lei", "legal_name")[:bond_limit]
+    for bond_number, lei_and_legal_name in enumerate(recent_bonds.iterator()):
+        if bond_number % TIME_CHECK_INTERVAL == 0 and budget.expired():
+            break
+        counts[lei_and_legal_name] += 1
+
+    return counts
+
+
+def warm_up_tokens(time_budget, memory_budget):
+    """
+    Preloads the most recently issued auth tokens into the shared cache. Stops once time_budget seconds have passed
+    or memory_budget bytes of entries have been cached. The query is limited to the tokens which could fit in
+    memory_budget, and reads them in an order served by an index. Returns the number of tokens cached and the bytes
+    used.
+    """
+
+    budget = WarmUpBudget(time_budget, memory_budget)
+
+    tokens = (Token.objects.order_by("-created").values_list("key", "user_id", "user__is_active")
+              [:memory_budget // MIN_TOKEN_ENTRY_SIZE])
+    token_count, _ = cache_within_budget(
+        ((TOKEN_KEY.format(key=key), (user_id, is_active), (key, (user_id, is_active)))
+         for key, user_id, is_active in tokens.iterator()),
+        lambda batch: cache_tokens(dict(batch)), budget)
+
+    return {"tokens": token_count, "bytes": budget.bytes_used}
+
+
+def warm_up_legal_names(time_budget, memory_budget):
+    """
+    Preloads the legal names of the LEI codes most used by recent bonds into this process's cache. Stops once
+    time_budget seconds have passed or memory_budget bytes of entries have been cached. Only the recent bonds which
+    could fit in memory_budget are read, newest first using the primary key, so the query never scans the whole
+    table before the budget is checked. Returns the number of legal names cached and the bytes used.
+    """
+
+    budget = WarmUpBudget(time_budget, memory_budget)
+
+    legal_name_limit = memory_budget // MIN_LEGAL_NAME_ENTRY_SIZE
+    legal_names = count_recent_legal_names(legal_name_limit * RECENT_BONDS_PER_LEGAL_NAME, budget)
+    legal_name_count, _ = cache_within_budget(
+        ((LEGAL_NAME_KEY.format(lei=lei_code), legal_name, (lei_code, legal_name))
+         for (lei_code, legal_name), _ in legal_names.most_common(legal_name_limit)),
+        lambda batch: cache_legal_names(dict(batch)), budget)
+
+    return {"legal_names": legal_name_count, "bytes": budget.bytes_used}
+
+
+def warm_up_on_startup():
+    """
+    Warms up the legal name cache of a server process if BONDS_WARM_UP_ON_STARTUP is set. Called from the WSGI
+    entry point rather than AppConfig.ready(), so that management commands and tests never query the database when
+    they start.
+    """
+
+    if not settings.BONDS_WARM_UP_ON_STARTUP:
+        return
+
+    # Warming up is only an optimisation, so never stop the server starting, e.g. before migrations have run
+    try:
+        stats = warm_up_legal_names(settings.BONDS_WARM_UP_TIME_BUDGET, settings.BONDS_WARM_UP_MEMORY_BUDGET)
+        logger.info("Warmed up the cache with %(legal_names)d legal names (%(bytes)d bytes)", stats)
+    except DatabaseError:
+        logger.warning("Could not warm up the cache", exc_info=True)
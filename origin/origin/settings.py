@@ -72,6 +72,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'origin.wsgi.application'
 
+# To cache auth tokens, point the 'shared' cache below at memcached or Redis and replace TokenAuthentication with
+# 'bonds.authentication.CachedTokenAuthentication'.
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.TokenAuthentication',
@@ -79,8 +82,46 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_THROTTLE_RATES': {
+        'bonds_read': '600/minute',
+        'bonds_write': '120/minute',
+    },
 }
 
+# Limit on requests to the GLEIF API, shared by all worker processes. Requests wait up to GLEIF_MAX_WAIT seconds
+# for capacity before giving up.
+
+GLEIF_REQUESTS_PER_SECOND = 10
+GLEIF_BURST = 20
+GLEIF_MAX_WAIT = 5
+
+# Cache
+# https://docs.djangoproject.com/en/2.1/ref/settings/#caches
+
+# The default cache is local to each process. The shared cache is only used to cache auth tokens, which every worker
+# process must agree on, so is disabled until it is pointed at memcached or Redis.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+}
+
+# Preload the LEI legal name cache of each server process from the database when it starts, so the first requests
+# after a deploy or restart don't all miss the cache. Warm-up stops after the time budget (seconds) or once the memory
+# budget (bytes) of cache entries has been loaded, whichever comes first. The same budgets apply to preloading auth
+# tokens with `./manage.py warm_up_tokens`.
+
+BONDS_WARM_UP_ON_STARTUP = True
+BONDS_WARM_UP_TIME_BUDGET = 2
+BONDS_WARM_UP_MEMORY_BUDGET = 16 * 1024 * 1024
+
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
@@ -17,11 +17,13 @@ from django.contrib import admin
 from django.urls import path
 from rest_framework.authtoken import views
 
-from bonds.views import Bonds, Register
+from bonds.views import BondAnalytics, BondExport, Bonds, Register
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('bonds/', Bonds.as_view()),
+    path('bonds/analytics/', BondAnalytics.as_view()),
+    path('bonds/export/', BondExport.as_view()),
     path('register/', Register.as_view()),
     path('api-token-auth/', views.obtain_auth_token, name="api-token-auth")
 ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'origin.settings')
 
 application = get_wsgi_application()
+
+# Warm up this server process's caches here rather than in the bonds app's ready(), which every management command runs
+from bonds.warmup import warm_up_on_startup  # noqa: E402
+
+warm_up_on_startup()